@@ -6,13 +6,13 @@ import numpy as np
 import pandas as pd
 import torch
 import yaml
-from torch.utils.data import DataLoader
 
 import utils.data as od
 from utils.anomaly_detection_utils import (
     multivariate_anomaly_detection,
     univariate_anomaly_detection,
 )
+from utils.dataloader import build_dataloader, dequantize
 
 warnings.filterwarnings("ignore")
 
@@ -64,13 +64,14 @@ def test_tadgan(
         """
         TESTING LOOP
         """
-        for batch, (sample, index, y, y_index, x_index) in enumerate(test_loader):
-            x = encoder(sample.float().cuda())
+        for batch, (sample, y, x_index, y_index) in enumerate(test_loader):
+            sample = dequantize(sample.cuda(non_blocking=True), test_loader.dataset)
+            x = encoder(sample.float())
 
             if decoder.hyperbolic:
                 hyper, eucl = decoder(x)
                 hyper_x = decoder.hyperbolic_linear(
-                    sample.view(-1, signal_shape).float().cuda()
+                    sample.view(-1, signal_shape).float()
                 )
 
                 if sample.shape[0] == 1:
@@ -84,14 +85,14 @@ def test_tadgan(
                         torch.squeeze(hyper_x).cpu().detach().numpy().reshape(1, -1)
                     )
                     critic_score.extend(
-                        critic_x(sample.cuda()).cpu().detach().numpy().reshape(-1)
+                        critic_x(sample).cpu().detach().numpy().reshape(-1)
                     )
                 else:
                     recons_signal.append(torch.squeeze(hyper).cpu().detach().numpy())
                     eucl_recons.append(torch.squeeze(eucl).cpu().detach().numpy())
                     hyper_real.append(torch.squeeze(hyper_x).cpu().detach().numpy())
                     critic_score.extend(
-                        torch.squeeze(critic_x(sample.cuda())).cpu().detach().numpy()
+                        torch.squeeze(critic_x(sample)).cpu().detach().numpy()
                     )
             else:
                 reconstructed_signal = decoder(x)
@@ -100,17 +101,17 @@ def test_tadgan(
                         reconstructed_signal.cpu().detach().numpy().reshape(1, -1)
                     )
                     critic_score.extend(
-                        critic_x(sample.cuda()).cpu().detach().numpy().reshape(-1)
+                        critic_x(sample).cpu().detach().numpy().reshape(-1)
                     )
                 else:
                     recons_signal.append(
                         torch.squeeze(reconstructed_signal).cpu().detach().numpy()
                     )
                     critic_score.extend(
-                        torch.squeeze(critic_x(sample.cuda())).cpu().detach().numpy()
+                        torch.squeeze(critic_x(sample)).cpu().detach().numpy()
                     )
 
-            true_signal.append(sample.numpy())
+            true_signal.append(sample.cpu().numpy())
 
         # save tensors for visualizations and post-processing
         recons_signal = np.concatenate(recons_signal)
@@ -119,19 +120,17 @@ def test_tadgan(
         torch.save(gt_signal, path + "gt_signal.pt")
         true_signal = np.concatenate(true_signal)
         torch.save(critic_score, path + "critic_score.pt")
-        try:
-            torch.save(index[0], path + "true_index.pt")  # type: ignore
-        except:
-            pass
+        if not params.signal == "multivariate":
+            # the full signal index is read once from the dataset, not from every
+            # batch; saved as a plain tensor whatever array type the dataset holds
+            true_index = torch.as_tensor(np.asarray(test_loader.dataset.index))
+            torch.save(true_index, path + "true_index.pt")
 
         if decoder.hyperbolic:
             true_signal = np.concatenate(hyper_real)
             eucl_recons = np.concatenate(eucl_recons)
             torch.save(eucl_recons, path + "eucl_recons.pt")
             torch.save(true_signal, path + "real_hyper.pt")
-        if not params.signal == "multivariate":
-            x_index = index[0]  # type: ignore
-            true_index = x_index
 
     if params.signal == "multivariate":
         multivariate_anomaly_detection(
@@ -175,7 +174,12 @@ if __name__ == "__main__":
     train_dataset, test_dataset, read_path = od.dataset_selection(params)
 
     batch_size = params.batch_size
-    test_loader = DataLoader(test_dataset, batch_size=batch_size, drop_last=False, shuffle=False, num_workers=6)  # type: ignore
+    test_loader = build_dataloader(
+        test_dataset,
+        batch_size=batch_size,
+        shuffle=False,
+        num_workers=getattr(params, "num_workers", None),
+    )
 
     dataset = params.dataset
 
@@ -4,12 +4,12 @@
 import argparse
 
 import yaml
-from torch.utils.data import DataLoader
 
 import anomaly_detection
 import utils.data as od
 from hyperspace.utils import *
 from train import train
+from utils.dataloader import build_dataloader
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="HypAD")
@@ -32,19 +32,19 @@ if __name__ == "__main__":
     train_dataset, test_dataset, read_path = od.dataset_selection(params)
 
     batch_size = params.batch_size
-    train_loader = DataLoader(
+    num_workers = getattr(params, "num_workers", None)
+    train_loader = build_dataloader(
         train_dataset,
         batch_size=batch_size,
-        drop_last=True,
         shuffle=True,
-        num_workers=2,
+        num_workers=num_workers,
+        drop_last=True,
     )
-    test_loader = DataLoader(
+    test_loader = build_dataloader(
         test_dataset,
         batch_size=batch_size,
-        drop_last=False,
         shuffle=False,
-        num_workers=2,
+        num_workers=num_workers,
     )
 
     """
@@ -13,6 +13,7 @@ from torch.autograd import grad as torch_grad
 
 import models.tadgan as tadgan
 from hyperspace.utils import *
+from utils.dataloader import dequantize
 
 
 def critic_x_iteration(sample, decoder, critic_x, optim_cx, params):
@@ -317,14 +318,13 @@ def train_tadgan(
             cz_loss = list()
 
             for batch, sample in enumerate(train_loader):
-                loss = critic_x_iteration(
-                    sample.cuda(), decoder, critic_x, optim_cx, params
+                sample = dequantize(
+                    sample.cuda(non_blocking=True), train_loader.dataset
                 )
+                loss = critic_x_iteration(sample, decoder, critic_x, optim_cx, params)
                 cx_loss.append(loss)
 
-                loss = critic_z_iteration(
-                    sample.cuda(), encoder, critic_z, optim_cz, params
-                )
+                loss = critic_z_iteration(sample, encoder, critic_z, optim_cz, params)
                 cz_loss.append(loss)
 
             cx_nc_loss.append(torch.mean(torch.tensor(cx_loss)))
@@ -346,8 +346,9 @@ def train_tadgan(
         mse_losss = list()
         for batch, sample in enumerate(train_loader):
             # enc_loss = encoder_iteration(sample.cuda())
+            sample = dequantize(sample.cuda(non_blocking=True), train_loader.dataset)
             dec_loss, hyper_loss, mse_loss = decoder_iteration(
-                sample.cuda(), encoder, decoder, critic_x, critic_z, optim_dec, params
+                sample, encoder, decoder, critic_x, critic_z, optim_dec, params
             )
             # encoder_loss.append(enc_loss)
             decoder_loss.append(dec_loss)
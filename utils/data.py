@@ -14,11 +14,12 @@ https://s3-us-west-2.amazonaws.com/telemanom/data.zip
 import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pandas as pd
 
-from utils.dataloader import SignalDataset
+from utils.dataloader import SIGNAL_COLUMNS, SIGNAL_DTYPES, SignalDataset
 from utils.dataloader_multivariate import MultivariateDataset
 
 LOGGER = logging.getLogger(__name__)
@@ -111,7 +112,7 @@ NASA_SIGNALS = (
 )
 
 
-def download(name, test_size=None, data_path=DATA_PATH):
+def download(name, test_size=None, data_path=DATA_PATH, columns=None, dtypes=None):
     """Load the CSV with the given name from S3.
 
     If the CSV has never been loaded before, it will be downloaded
@@ -131,6 +132,10 @@ def download(name, test_size=None, data_path=DATA_PATH):
         name (str): Name of the CSV to load.
         test_size (float): Value between 0 and 1 indicating the proportional
             size of the test split. If 0 or None (default), the data is not split.
+        columns (list): Optional. Names of the columns to return. If None (default),
+            all the columns are returned. The cached CSV always keeps every column.
+        dtypes (dict): Optional. Mapping from column name to the dtype it is returned
+            as. If None (default), dtypes are inferred.
 
     Returns:
         If no test_size is given, a single pandas.DataFrame is returned containing all
@@ -150,7 +155,7 @@ def download(name, test_size=None, data_path=DATA_PATH):
         filename = os.path.join(data_path, name + ".csv")
 
     if os.path.exists(filename):
-        data = pd.read_csv(filename)
+        data = pd.read_csv(filename, usecols=columns, dtype=dtypes)
     else:
         url = url or S3_URL.format(BUCKET, "{}.csv".format(name))
 
@@ -158,7 +163,13 @@ def download(name, test_size=None, data_path=DATA_PATH):
         os.makedirs(data_path, exist_ok=True)
         print(url)
         data = pd.read_csv(url)
+        # the local copy is cached unchanged, columns and dtypes only apply to
+        # the returned frame
         data.to_csv(filename, index=False)
+        if columns is not None:
+            data = data[columns]
+        if dtypes is not None:
+            data = data.astype(dtypes)
 
     return data
 
@@ -168,12 +179,19 @@ def download_demo(path="orion-data", split=False):
         os.makedirs(path, exist_ok=True)
 
     LOGGER.info("Downloading Orion Demo Data to folder %s", path)
-    for signal in NASA_SIGNALS[0:3]:
-        if split:
-            download(signal + "-train", data_path=path)
-            download(signal + "-test", data_path=path)
-        else:
-            download(signal, data_path=path)
+    if split:
+        names = [
+            signal + suffix
+            for signal in NASA_SIGNALS[0:3]
+            for suffix in ("-train", "-test")
+        ]
+    else:
+        names = list(NASA_SIGNALS[0:3])
+
+    # the downloads are independent and I/O bound, so they are run concurrently;
+    # consuming the results re-raises any download error
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda name: download(name, data_path=path), names))
 
 
 def load_csv(path, timestamp_column=None, value_column=None):
@@ -195,24 +213,20 @@ def load_csv(path, timestamp_column=None, value_column=None):
     elif timestamp_column == value_column:
         raise ValueError("timestamp_column cannot be the same as value_column")
 
-    timestamp_column_name = data.columns[timestamp_column]
-    value_column_name = data.columns[value_column]
-    columns = {
-        "timestamp": data[timestamp_column_name].values,
-        "value": data[value_column_name].values,
-    }
+    data = data.iloc[:, [timestamp_column, value_column]].copy()
+    data.columns = ["timestamp", "value"]
 
-    return pd.DataFrame(columns)[["timestamp", "value"]]
+    return data
 
 
 def load_signal(signal, test_size=None, timestamp_column=None, value_column=None):
     if os.path.isfile(signal):
         data = load_csv(signal, timestamp_column, value_column)
+        data["timestamp"] = data["timestamp"].astype(int)
+        data["value"] = data["value"].astype(float)
     else:
-        data = download(signal)
-
-    data["timestamp"] = data["timestamp"].astype(int)
-    data["value"] = data["value"].astype(float)
+        # parse straight into the final dtypes instead of casting afterwards
+        data = download(signal, columns=SIGNAL_COLUMNS, dtypes=SIGNAL_DTYPES)
 
     if test_size is None:
         return data
@@ -326,18 +340,17 @@ def dataset_selection(params):
         )
 
     else:
+        quantize = getattr(params, "quantize", False)
         # univariate dataset with train=test
         if params.unique_dataset:
             # train_data = load_signal(params.signal)
             # test_data = load_signal(params.signal)
             train_dataset = SignalDataset(
-                path="./data/{}.csv".format(params.signal), interval=params.interval
-            )
-            test_dataset = SignalDataset(
                 path="./data/{}.csv".format(params.signal),
-                test=True,
                 interval=params.interval,
+                quantize=quantize,
             )
+            test_dataset = SignalDataset.from_existing(train_dataset)
             read_path = "./data/{}.csv".format(params.signal)
 
         # YAHOO dataset
@@ -348,15 +361,9 @@ def dataset_selection(params):
                 ),
                 interval=1,
                 yahoo=True,
+                quantize=quantize,
             )
-            test_dataset = SignalDataset(
-                path="./data/YAHOO/{}Benchmark/{}.csv".format(
-                    params.dataset, params.signal
-                ),
-                test=True,
-                interval=1,
-                yahoo=True,
-            )
+            test_dataset = SignalDataset.from_existing(train_dataset)
             read_path = "./data/YAHOO/{}Benchmark/{}.csv".format(
                 params.dataset, params.signal
             )
@@ -368,11 +375,14 @@ def dataset_selection(params):
             train_dataset = SignalDataset(
                 path="./data/{}-train.csv".format(params.signal),
                 interval=params.interval,
+                quantize=quantize,
             )
             test_dataset = SignalDataset(
                 path="./data/{}-test.csv".format(params.signal),
                 interval=params.interval,
                 test=True,
+                stats=train_dataset.stats,
+                quantize=quantize,
             )
             read_path = "./data/{}-test.csv".format(params.signal)
 
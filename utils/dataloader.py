@@ -1,15 +1,22 @@
+import functools
+import hashlib
 import os
-from datetime import datetime
+import shutil
+import tempfile
 
 import numpy as np
 import pandas as pd
 import torch
-from dateutil.rrule import DAILY, SECONDLY, rrule
-from scipy import signal as scipy_signal
-from sklearn.impute import SimpleImputer
-from sklearn.preprocessing import MinMaxScaler
+from numpy.lib.stride_tricks import sliding_window_view
 from torch.utils.data import DataLoader, Dataset
 
+SIGNAL_COLUMNS = ["timestamp", "value"]
+SIGNAL_DTYPES = {"timestamp": "int64", "value": "float32"}
+# arrays of a preprocessed signal, each cached as its own .npy so it can be mmapped
+CACHED_ARRAYS = ("X", "index", "col_mean", "min", "max")
+# bump whenever preprocessing changes, so stale caches are not served
+CACHE_VERSION = 1
+
 
 def save_known_anomalies(df, path):
     # if not os.path.exists(path[:-4]+'_known_anomalies.csv'):
@@ -34,17 +41,25 @@ def save_known_anomalies(df, path):
 
 
 def _detrend_signal(df, value_column):
+    from scipy import signal as scipy_signal
+
     df[value_column] = scipy_signal.detrend(df[value_column])
     return df
 
 
+def _yahoo_timestamps(length):
+    # one timestamp per second from 2012-11-24 until 2012-11-30 (inclusive),
+    # computed in a single vectorized step instead of converting each datetime
+    from datetime import datetime
+
+    start_ts = datetime(2012, 11, 24).timestamp()
+    max_length = int(datetime(2012, 11, 30).timestamp() - start_ts) + 1
+    return start_ts + np.arange(min(length, max_length), dtype=np.float64)
+
+
 def yahoo_preprocess(df):
     df = _detrend_signal(df, "value")
-    random_index = list(
-        rrule(SECONDLY, dtstart=datetime(2012, 11, 24), until=datetime(2012, 11, 30))
-    )[: len(df)]
-    x_index = np.array(list(map(lambda x: datetime.timestamp(x), random_index)))
-    df["timestamp"] = x_index
+    df["timestamp"] = _yahoo_timestamps(len(df))
 
     # df = save_known_anomalies(df,path)
     try:
@@ -58,43 +73,264 @@ def yahoo_preprocess(df):
     return df
 
 
-class SignalDataset(Dataset):
-    def __init__(self, path, interval=21600, windows_size=100, test=False, yahoo=None):
-        self.signal_df = pd.read_csv(path)
+def _impute_and_scale(X, stats=None):
+    # mean imputation followed by min-max scaling to [-1, 1], fitted on X unless
+    # the (column mean, min, max) stats of another dataset are given
+    if stats is None:
+        col_mean = np.nanmean(X, axis=0)
+        filled = np.where(np.isnan(X), col_mean, X)
+        stats = (col_mean, filled.min(axis=0), filled.max(axis=0))
+    col_mean, mn, mx = stats
 
-        if yahoo:
-            self.signal_df = _detrend_signal(self.signal_df, "value")
-            random_index = list(
-                rrule(
-                    SECONDLY,
-                    dtstart=datetime(2012, 11, 24),
-                    until=datetime(2012, 11, 30),
-                )
-            )[: len(self.signal_df)]
-            x_index = np.array(list(map(lambda x: datetime.timestamp(x), random_index)))
-            self.signal_df["timestamp"] = x_index
+    X = np.where(np.isnan(X), col_mean, X)
+    data_range = mx - mn
+    data_range = np.where(data_range == 0, 1, data_range)
+    return 2 * (X - mn) / data_range - 1, stats
+
+
+def dequantize(sample, dataset):
+    """Undo the int8 quantization of a batch coming from `dataset`, if any.
+    Args:
+        sample (torch.Tensor):
+            Batch of samples, ideally already moved to the device.
+        dataset (torch.utils.data.Dataset):
+            Dataset the batch was loaded from.
+    Returns:
+        torch.Tensor
+    """
+    dequant_scale = getattr(dataset, "dequant_scale", None)
+    if dequant_scale is None:
+        return sample
+    return sample.float() * dequant_scale
+
+
+def _valid_starts(drop_mask, window_size, target_size, offset, step_size):
+    # scan for window starts, jumping past the last invalid row of a window
+    max_start = len(drop_mask) - window_size - target_size - offset + 1
+    starts = np.empty(max(max_start, 0), dtype=np.int64)
+    n_starts = 0
+    start = 0
+    while start < max_start:
+        last_drop = -1
+        for i in range(start + window_size + target_size - 1, start - 1, -1):
+            if drop_mask[i]:
+                last_drop = i
+                break
+
+        if last_drop >= 0:
+            start = last_drop + 1
+            continue
 
-            self.signal_df = save_known_anomalies(self.signal_df, path)
-            self.signal_df = self.signal_df[["timestamp", "value"]]
+        starts[n_starts] = start
+        n_starts += 1
+        start += step_size
 
+    return starts[:n_starts]
+
+
+@functools.lru_cache(maxsize=None)
+def _jit_valid_starts():
+    # numba is only imported, and the scan compiled, the first time windows are dropped
+    from numba import njit
+
+    return njit(cache=True)(_valid_starts)
+
+
+def build_dataloader(
+    dataset, batch_size, shuffle, device=None, num_workers=None, drop_last=False
+):
+    """Build a DataLoader that prefetches batches in worker processes.
+    Args:
+        dataset (torch.utils.data.Dataset):
+            Dataset to load batches from.
+        batch_size (int):
+            Number of samples per batch.
+        shuffle (bool):
+            Whether to reshuffle the samples at every epoch.
+        device (torch.device or None):
+            Optional. Device the batches are moved to. Batches are pinned in
+            page-locked memory when it is a CUDA device. If not given, CUDA is used
+            when available.
+        num_workers (int or None):
+            Optional. Number of loading worker processes. If not given, half of the
+            available CPUs is used.
+        drop_last (bool):
+            Optional. Whether to drop the last incomplete batch. If not given,
+            `False` is used.
+    Returns:
+        torch.utils.data.DataLoader
+    """
+    if device is None:
+        device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    if num_workers is None:
+        num_workers = (os.cpu_count() or 1) // 2
+
+    # workers are kept alive across epochs, prefetching is only valid with workers
+    worker_kwargs = {}
+    if num_workers > 0:
+        worker_kwargs = dict(persistent_workers=True, prefetch_factor=2)
+
+    return DataLoader(
+        dataset,
+        batch_size=batch_size,
+        shuffle=shuffle,
+        drop_last=drop_last,
+        num_workers=num_workers,
+        pin_memory=(device.type == "cuda"),
+        **worker_kwargs,
+    )
+
+
+class SignalDataset(Dataset):
+    def __init__(
+        self,
+        path,
+        interval=21600,
+        windows_size=100,
+        test=False,
+        yahoo=None,
+        cache=True,
+        stats=None,
+        quantize=False,
+    ):
         self.interval = interval
         self.windows_size = windows_size
         self.test = test
-        self.X, self.index = self.time_segments_aggregate(
-            self.signal_df, interval=self.interval, time_column="timestamp"
-        )
-        imp = SimpleImputer()
-        self.X = imp.fit_transform(self.X)
-        scaler = MinMaxScaler(feature_range=(-1, 1))
-        self.X = scaler.fit_transform(self.X)
-        self.X, self.y, self.X_index, self.y_index = self.rolling_window_sequences(
-            self.X,
+        self.quantize = quantize
+
+        # the aggregated, imputed and scaled signal is cached next to the CSV,
+        # windowing is a cheap strided view so it is redone on every load
+        cache_dir = self._cache_dir(path, interval, yahoo, stats)
+        cached = None
+        # YAHOO signals also need the known anomalies written while preprocessing
+        if cache and (not yahoo or os.path.exists(path[:-4] + "_known_anomalies.csv")):
+            cached = self._load_cache(cache_dir)
+
+        if cached is not None:
+            signal, self.index = cached["X"], cached["index"]
+            self.stats = (cached["col_mean"], cached["min"], cached["max"])
+        else:
+            signal, self.index, self.stats = self._preprocess(path, yahoo, stats)
+            if cache:
+                arrays = (signal, self.index) + tuple(self.stats)
+                self._save_cache(cache_dir, dict(zip(CACHED_ARRAYS, arrays)))
+
+        # only the targets and indices are kept, the windows served are X_t below
+        windows, self.y, self.X_index, self.y_index = self.rolling_window_sequences(
+            signal,
             self.index,
             window_size=self.windows_size,
             target_size=1,
             step_size=1,
             target_column=0,
         )
+        self.y = np.ascontiguousarray(self.y, dtype=np.float32)
+
+        # symmetric int8 quantization of the [-1, 1] signal, samples are dequantized
+        # on the device with `dequant_scale`; test signals scaled with train stats
+        # can fall outside [-1, 1] and are clipped
+        self.dequant_scale = None
+        if quantize:
+            signal = np.clip(np.round(signal * 127), -127, 127).astype(np.int8)
+            self.dequant_scale = 1 / 127.0
+
+        # the numpy windows are read-only views, so the tensor windows are unfolded
+        # directly over the (writable, possibly memory-mapped) N x d signal;
+        # __getitem__ then only slices a view of it
+        signal_t = torch.from_numpy(signal)
+        if len(windows):
+            self.X_t = signal_t.unfold(0, self.windows_size, 1).transpose(1, 2)
+            self.X_t = self.X_t[: len(windows)]
+        else:
+            self.X_t = signal_t.new_empty((0, self.windows_size, signal_t.shape[1]))
+
+    @classmethod
+    def from_existing(cls, other, test=True):
+        """Create a dataset over the same signal as `other`.
+        All the arrays are shared by reference, only the `test` flag differs.
+        Args:
+            other (SignalDataset):
+                Dataset whose preprocessed signal and windows are reused.
+            test (bool):
+                Optional. Whether the new dataset is used for testing. If not given,
+                `True` is used.
+        Returns:
+            SignalDataset
+        """
+        dataset = cls.__new__(cls)
+        dataset.__dict__.update(other.__dict__)
+        dataset.test = test
+        return dataset
+
+    @staticmethod
+    def _cache_dir(path, interval, yahoo, stats):
+        key = "{}-{}-{}-{}-{}".format(
+            CACHE_VERSION,
+            os.path.abspath(path),
+            os.path.getmtime(path),
+            interval,
+            bool(yahoo),
+        )
+        cache_key = hashlib.md5(key.encode())
+        # signals scaled with the stats of another dataset are cached separately
+        if stats is not None:
+            for stat in stats:
+                cache_key.update(np.asarray(stat, dtype=np.float64).tobytes())
+        return "{}.{}.cache".format(path, cache_key.hexdigest())
+
+    @staticmethod
+    def _load_cache(cache_dir):
+        # copy-on-write memory maps: the pages are writable, so torch can wrap them
+        # without a copy, yet stay shared between DataLoader workers through the
+        # page cache as long as nobody writes to them
+        if not os.path.isdir(cache_dir):
+            return None
+        try:
+            return {
+                name: np.load(os.path.join(cache_dir, name + ".npy"), mmap_mode="c")
+                for name in CACHED_ARRAYS
+            }
+        except (OSError, ValueError):
+            # incomplete or corrupted cache, preprocess the signal again
+            return None
+
+    @staticmethod
+    def _save_cache(cache_dir, arrays):
+        # arrays are written to a temporary directory which is then renamed into
+        # place, so an interrupted or concurrent run never leaves a partial cache;
+        # an unwritable data directory simply leaves the signal uncached
+        tmp_dir = None
+        try:
+            tmp_dir = tempfile.mkdtemp(
+                prefix=os.path.basename(cache_dir) + ".",
+                dir=os.path.dirname(os.path.abspath(cache_dir)),
+            )
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_dir, name + ".npy"), array)
+            os.replace(tmp_dir, cache_dir)
+        except OSError:
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _preprocess(self, path, yahoo, stats=None):
+        if yahoo:
+            signal_df = pd.read_csv(path)
+            signal_df = _detrend_signal(signal_df, "value")
+            signal_df["timestamp"] = _yahoo_timestamps(len(signal_df))
+
+            signal_df = save_known_anomalies(signal_df, path)
+            signal_df = signal_df[["timestamp", "value"]]
+        else:
+            # only the signal columns are needed, parsed straight into their dtypes
+            signal_df = pd.read_csv(path, usecols=SIGNAL_COLUMNS, dtype=SIGNAL_DTYPES)
+
+        X, index = self.time_segments_aggregate(
+            signal_df, interval=self.interval, time_column="timestamp"
+        )
+        X, stats = _impute_and_scale(X, stats)
+        # row-major float32, so samples are handed to torch without conversion
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return X, index, stats
 
     def time_segments_aggregate(self, X, interval, time_column, method=["mean"]):
         """Aggregate values over given time span.
@@ -116,25 +352,29 @@ class SignalDataset(Dataset):
         if isinstance(X, np.ndarray):
             X = pd.DataFrame(X)
 
-        X = X.sort_values(time_column).set_index(time_column)
+        # signals are usually stored in time order already, only sort when needed
+        if not X[time_column].is_monotonic_increasing:
+            X = X.sort_values(time_column)
 
         if isinstance(method, str):
             method = [method]
 
-        start_ts = X.index.values[0]
-        max_ts = X.index.values[-1]
+        timestamps = X[time_column].values
+        start_ts = timestamps[0]
 
-        values = list()
-        index = list()
-        while start_ts <= max_ts:
-            end_ts = start_ts + interval
-            subset = X.loc[start_ts : end_ts - 1]
-            aggregated = [getattr(subset, agg)(skipna=True).values for agg in method]
-            values.append(np.concatenate(aggregated))
-            index.append(start_ts)
-            start_ts = end_ts
+        # bucket every row by its interval offset from the first timestamp,
+        # then aggregate all buckets in a single groupby pass
+        bucket_id = ((timestamps - start_ts) // interval).astype(np.int64)
+        value_columns = [column for column in X.columns if column != time_column]
+        grouped = X.groupby(bucket_id)[value_columns]
+        aggregated = pd.concat(
+            [getattr(grouped, agg)() for agg in method], axis=1
+        ).reindex(np.arange(bucket_id[-1] + 1))
 
-        return np.asarray(values), np.asarray(index)
+        values = aggregated.to_numpy()
+        index = start_ts + aggregated.index.values * interval
+
+        return values, index
 
     def rolling_window_sequences(
         self,
@@ -180,53 +420,60 @@ class SignalDataset(Dataset):
                 * first index value of each input sequence.
                 * first index value of each target sequence.
         """
-        out_X = list()
-        out_y = list()
-        X_index = list()
-        y_index = list()
         target = X[:, target_column]
 
-        if drop_windows:
-            if hasattr(drop, "__len__") and (not isinstance(drop, str)):
-                if len(drop) != len(X):
-                    raise Exception("Arrays `drop` and `X` must be of the same length.")
+        if not drop_windows:
+            # every window is valid: build them as strided views instead of copies
+            max_start = max(len(X) - window_size - target_size - offset + 1, 0)
+            starts = np.arange(0, max_start, step_size)
+            if max_start == 0:
+                # signal shorter than a single window, sliding_window_view would fail
+                return (
+                    np.empty((0, window_size, X.shape[1]), dtype=X.dtype),
+                    np.empty((0, target_size), dtype=X.dtype),
+                    index[starts],
+                    index[starts],
+                )
+            windows = sliding_window_view(X, (window_size, X.shape[1]))[:, 0]
+            targets = sliding_window_view(target, target_size)
+            target_start = window_size + offset
+
+            return (
+                windows[:max_start:step_size],
+                targets[target_start : target_start + max_start : step_size],
+                index[starts],
+                index[starts + target_start],
+            )
+
+        if hasattr(drop, "__len__") and (not isinstance(drop, str)):
+            if len(drop) != len(X):
+                raise Exception("Arrays `drop` and `X` must be of the same length.")
+        else:
+            if isinstance(drop, float) and np.isnan(drop):
+                drop = np.isnan(X)
             else:
-                if isinstance(drop, float) and np.isnan(drop):
-                    drop = np.isnan(X)
-                else:
-                    drop = X == drop
-
-        start = 0
-        max_start = len(X) - window_size - target_size - offset + 1
-        while start < max_start:
-            end = start + window_size
-
-            if drop_windows:
-                drop_window = drop[start : end + target_size]
-                to_drop = np.where(drop_window)[0]
-                if to_drop.size:
-                    start += to_drop[-1] + 1
-                    continue
-
-            out_X.append(X[start:end])
-            out_y.append(target[end + offset : end + offset + target_size])
-            X_index.append(index[start])
-            y_index.append(index[end + offset])
-            start = start + step_size
+                drop = X == drop
+
+        # a window is invalid if any of its rows has a value to drop
+        drop_mask = np.asarray(drop, dtype=bool).reshape(len(X), -1).any(axis=1)
+        starts = _jit_valid_starts()(
+            drop_mask, window_size, target_size, offset, step_size
+        )
+        target_starts = starts + window_size + offset
 
         return (
-            np.asarray(out_X),
-            np.asarray(out_y),
-            np.asarray(X_index),
-            np.asarray(y_index),
+            X[np.add.outer(starts, np.arange(window_size))],
+            target[np.add.outer(target_starts, np.arange(target_size))],
+            index[starts],
+            index[target_starts],
         )
 
     def __len__(self):
-        return len(self.X)
+        return len(self.X_t)
 
     def __getitem__(self, idx):
-        row = self.X[idx]
-        x = torch.from_numpy(row)
+        x = self.X_t[idx]
         if self.test:
-            return x, self.index, self.y, self.y_index, self.X_index
+            # only per-sample metadata, the full `index` is read from the dataset
+            return x, self.y[idx], self.X_index[idx], self.y_index[idx]
         return x
@@ -7,9 +7,6 @@ import numpy as np
 import pandas as pd
 import torch
 from dateutil.rrule import DAILY, SECONDLY, rrule
-from sklearn.impute import SimpleImputer
-from sklearn.model_selection import StratifiedShuffleSplit
-from sklearn.preprocessing import MinMaxScaler
 from torch.utils.data import DataLoader, Dataset
 
 
@@ -22,6 +19,11 @@ class MultivariateDataset(Dataset):
         split=1,
         dataset="CASAS",
     ):
+        # sklearn is only needed to preprocess, not in the loader worker processes
+        from sklearn.impute import SimpleImputer
+        from sklearn.model_selection import StratifiedShuffleSplit
+        from sklearn.preprocessing import MinMaxScaler
+
         self.test = test
 
         if dataset == "CASAS_":
@@ -117,5 +119,5 @@ class MultivariateDataset(Dataset):
         x = torch.from_numpy(row)
 
         if self.test:
-            return x, [], self.y, [], []
+            return x, [], [], []
         return x